@@ -19,10 +19,19 @@ What does a valid dice formula look like?
     d20+2+4-1           -> (1d20+5)
     d8+1-2+3+d4         -> (1d8+2) + (1d4+0)
     2d10-1+7-2d4+1-1+2  -> (2d10+6) - (2d4+2)
+    d20+d20+1d4         -> (2d20+0) + (1d4+0)
+    d6+1-d4+2d6-d4      -> (3d6+1) - (2d4+0)
+
+(NOTE: dice with the same number of sides that are all added, or all subtracted,
+ are combined into a single die, as seen in the last two examples)
 
 (NOTE: whitespace is allowed anywhere except within a number
  i.e. no "1 2 d 1 0 + 2", must be at least "12 d 10 + 2" or similar)
 
+(NOTE: when NumPy is installed, large rolls are drawn from a NumPy generator,
+ which random.seed() does not reach; use seed() from this module instead
+ to make rolls reproducible)
+
 
 
 Dice Formula Grammar
@@ -44,31 +53,106 @@ __all__ = [
         "DiceBag",
         "roll",
         "roll_to_str",
+        "seed",
         ]
 
 
+from collections.abc import Callable
 from dataclasses import dataclass, field
 from enum import StrEnum, auto
+import functools
 import random
+import re
+
+try:
+    import numpy as np
+except ImportError:     # NumPy is optional; rolling falls back to pure Python
+    np = None
 
 
 ########
 # Dice #
 ########
 
+# Below this many dice, the overhead of calling into NumPy outweighs the gain.
+_NUMPY_MIN_DICE = 5
+
+# NumPy rolls happen in int64, so they are only used when every total fits in one.
+_INT64_MAX = 2**63 - 1
+
+# DiceBags holding at most this many dice get a generated, fully unrolled roller.
+_UNROLL_MAX_DICE = 16
+
+# Without NumPy, dice with at most 255 sides are rolled a byte at a time from
+# this many dice upwards; see _roll_bytewise().
+_BYTEWISE_MIN_DICE = 32
+
+_rng = np.random.default_rng() if np is not None else None
+
+_face_tables: dict[int, bytes] = {}
+
+
+def _roll_bytewise(sides: int, num_dice: int) -> int:
+    """Roll `num_dice` dice with 2 to 255 sides, drawing one random byte per die.
+
+    Each byte is mapped to a face (or to 0, for the few values that would bias
+    the result) with bytes.translate(), so all the per-die work happens in C.
+    Rejected dice are redrawn until none are left.
+    """
+    table = _face_tables.get(sides)
+    if table is None:
+        limit = 256 - 256 % sides
+        table = _face_tables[sides] = bytes(b % sides + 1 if b < limit else 0 for b in range(256))
+
+    total = 0
+    while num_dice:
+        faces = random.randbytes(num_dice).translate(table)
+        total += sum(faces)
+        num_dice = faces.count(0)
+    return total
+
+
 @dataclass(frozen=True, slots=True)
 class Die:
     sides: int
     num_dice: int = 1
     modifier: int = 0
 
-    def __str__(self) -> str:
+    # Number of random bits needed to cover every face of the die.
+    _bits: int = field(init=False, repr=False, compare=False)
+    _str: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, '_bits', (self.sides - 1).bit_length())
         if self.modifier == 0:
-            return f"{self.num_dice}d{self.sides}"
-        return f"{self.num_dice}d{self.sides}{self.modifier:+}"
+            object.__setattr__(self, '_str', f"{self.num_dice}d{self.sides}")
+        else:
+            object.__setattr__(self, '_str', f"{self.num_dice}d{self.sides}{self.modifier:+}")
+
+    def __str__(self) -> str:
+        return self._str
 
     def roll(self) -> int:
-        return sum(random.randint(1, self.sides) for _ in range(self.num_dice)) + self.modifier
+        if (_rng is not None and self.num_dice >= _NUMPY_MIN_DICE
+                and self.sides * self.num_dice <= _INT64_MAX):
+            rolls = _rng.integers(1, self.sides, size=self.num_dice, dtype=np.int64, endpoint=True)
+            return int(rolls.sum()) + self.modifier
+        if self.sides <= 1:
+            return sum(random.randint(1, self.sides) for _ in range(self.num_dice)) + self.modifier
+        if self.num_dice >= _BYTEWISE_MIN_DICE and self.sides <= 255:
+            return _roll_bytewise(self.sides, self.num_dice) + self.modifier
+
+        # Rejection sampling: draw just enough bits to cover every face and
+        # redraw whenever the result lands past the last one.
+        getrandbits = random.getrandbits
+        bits = self._bits
+        sides = self.sides
+        total = self.modifier
+        for _ in range(self.num_dice):
+            while (face := getrandbits(bits)) >= sides:
+                pass
+            total += face + 1
+        return total
 
     def roll_to_str(self) -> str:
         return f"Rolled {self}    = {self.roll()}"
@@ -79,14 +163,139 @@ class DiceBagItem:
     die: Die
     subtracted: bool = False
 
+    # +1 or -1, resolved once so rolling doesn't have to branch on `subtracted`.
+    _sign: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, '_sign', -1 if self.subtracted else 1)
+
     def roll(self) -> int:
-        multiplier = -1 if self.subtracted else 1
-        return multiplier * self.die.roll()
+        return self._sign * self.die.roll()
+
+
+def _can_unroll(bag: tuple[DiceBagItem, ...]) -> bool:
+    """Whether `bag` is small enough to unroll, and holds only dice that can be rolled."""
+    return (sum(item.die.num_dice for item in bag) <= _UNROLL_MAX_DICE
+            and all(item.die.sides >= 1 for item in bag))
+
+
+def _compile_roller(bag: tuple[DiceBagItem, ...]) -> Callable[[], int]:
+    """Generate a function that rolls `bag` with every die unrolled and every modifier folded.
+
+    E.g. for 2d6+3 - 1d4:
+
+        def _roll(getrandbits=random.getrandbits):
+            total = 3
+            while (face := getrandbits(3)) >= 6:
+                pass
+            total += face + 1
+            while (face := getrandbits(3)) >= 6:
+                pass
+            total += face + 1
+            total -= getrandbits(2) + 1
+            return total
+
+    The generated function must draw exactly what rolling each item in turn
+    would, so that seed() gives the same results either way. Dice that
+    Die.roll() doesn't roll with getrandbits (d1s, and pools big enough for
+    NumPy) are therefore left to their own roll() method.
+
+    Only call this for bags that pass _can_unroll().
+    """
+    total = 0
+    delegated = []
+    lines = []
+    for item in bag:
+        die = item.die
+        op = '-=' if item.subtracted else '+='
+        if die.sides <= 1 or (_rng is not None and die.num_dice >= _NUMPY_MIN_DICE):
+            lines.append(f"    total {op} roll_{len(delegated)}()")
+            delegated.append(die.roll)
+            continue
+
+        total += item._sign * die.modifier
+        for _ in range(die.num_dice):
+            if die.sides == 1 << die._bits:     # every draw lands on a face
+                lines.append(f"    total {op} getrandbits({die._bits}) + 1")
+            else:
+                lines.append(f"    while (face := getrandbits({die._bits})) >= {die.sides}:")
+                lines.append("        pass")
+                lines.append(f"    total {op} face + 1")
+
+    params = ['getrandbits=random.getrandbits', *(f"roll_{i}=delegated[{i}]" for i in range(len(delegated)))]
+    source = '\n'.join([
+        f"def _roll({', '.join(params)}):",
+        f"    total = {total}",
+        *lines,
+        "    return total",
+        ])
+    namespace = {'random': random, 'delegated': delegated}
+    exec(compile(source, f"<roller for {bag!r}>", 'exec'), namespace)
+    return namespace['_roll']
+
+
+def _fits_int64(dice: list[Die]) -> bool:
+    """Whether `dice` can be rolled in int64 arithmetic without overflowing."""
+    return (all(die.sides >= 1 for die in dice)
+            and sum(die.sides * die.num_dice for die in dice) <= _INT64_MAX
+            and sum(abs(die.modifier) for die in dice) <= _INT64_MAX)
 
 
 @dataclass(frozen=True, slots=True)
 class DiceBag:
-    _bag: list[DiceBagItem] = field(default_factory=list)
+    _bag: tuple[DiceBagItem, ...] = ()
+
+    # Structure-of-arrays view of `_bag` for vectorized rolling. These are only
+    # built when NumPy is available, the bag holds enough dice to benefit, and
+    # no total can overflow an int64.
+    _sides: 'np.ndarray | None' = field(init=False, repr=False, compare=False)
+    _num_dice: 'np.ndarray | None' = field(init=False, repr=False, compare=False)
+    _modifier: 'np.ndarray | None' = field(init=False, repr=False, compare=False)
+    _sign: 'np.ndarray | None' = field(init=False, repr=False, compare=False)
+    _uniform_sides: bool = field(init=False, repr=False, compare=False)
+
+    # Specialized roller for small bags, generated by the first roll(); see _compile_roller().
+    # It is derived from `_bag` and can't be pickled, so __getstate__ leaves it out.
+    _unrollable: bool = field(init=False, repr=False, compare=False)
+    _compiled_roll: Callable[[], int] | None = field(init=False, repr=False, compare=False)
+    _str: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        unrollable = _can_unroll(self._bag)
+        object.__setattr__(self, '_unrollable', unrollable)
+        object.__setattr__(self, '_compiled_roll', None)
+
+        dice = [item.die for item in self._bag]
+        if (not unrollable and _rng is not None
+                and sum(die.num_dice for die in dice) >= _NUMPY_MIN_DICE
+                and _fits_int64(dice)):
+            sides = np.array([die.sides for die in dice], dtype=np.int64)
+            num_dice = np.array([die.num_dice for die in dice], dtype=np.int64)
+            modifier = np.array([die.modifier for die in dice], dtype=np.int64)
+            sign = np.array([item._sign for item in self._bag], dtype=np.int64)
+        else:
+            sides = num_dice = modifier = sign = None
+
+        object.__setattr__(self, '_sides', sides)
+        object.__setattr__(self, '_num_dice', num_dice)
+        object.__setattr__(self, '_modifier', modifier)
+        object.__setattr__(self, '_sign', sign)
+        object.__setattr__(self, '_uniform_sides', len({die.sides for die in dice}) == 1)
+
+        if not self._bag:
+            object.__setattr__(self, '_str', f"<empty {type(self).__name__}>")
+        else:
+            parts = [str(self._bag[0].die)]
+            for item in self._bag[1:]:
+                parts.append(f"{'-' if item.subtracted else '+'} {item.die}")
+            object.__setattr__(self, '_str', ' '.join(parts))
+
+    def __getstate__(self) -> tuple[DiceBagItem, ...]:
+        return self._bag
+
+    def __setstate__(self, state: tuple[DiceBagItem, ...]) -> None:
+        object.__setattr__(self, '_bag', state)
+        self.__post_init__()
 
     def __getitem__(self, key: int):
         return self._bag[key].die
@@ -95,16 +304,10 @@ class DiceBag:
         return len(self._bag)
 
     def __str__(self) -> str:
-        if not self._bag:
-            return f"<empty {type(self).__name__}>"
-
-        to_return = str(self._bag[0].die)
-        for item in self._bag[1:]:
-            to_return += f" {'-' if item.subtracted else '+'} {item.die}"
-
-        return to_return
+        return self._str
 
     @staticmethod
+    @functools.lru_cache(maxsize=1024)
     def from_str(formula: str) -> 'DiceBag':
         """Construct a DiceBag from a dice formula.
 
@@ -123,14 +326,29 @@ class DiceBag:
 
         Check the description of this module (e.g. help(__import__('dice')) )
         for a full breakdown of the grammar and more examples.
+
+        Parsed DiceBags are cached by formula, which is safe because they are immutable.
         """
         return Parser(formula).dice()
 
-    def add_die(self, die: Die, *, subtracted: bool = False) -> None:
-        self._bag.append(DiceBagItem(die, subtracted))
-
     def roll(self) -> int:
-        return sum(die.roll() for die in self._bag)
+        if self._compiled_roll is not None:
+            return self._compiled_roll()
+        if self._unrollable:
+            compiled_roll = _compile_roller(self._bag)
+            object.__setattr__(self, '_compiled_roll', compiled_roll)
+            return compiled_roll()
+        if self._sides is None:
+            return sum(item.roll() for item in self._bag)
+
+        # Draw every individual die in a single call, then weight each roll by
+        # the sign of the item it belongs to.
+        total = int(self._sign @ self._modifier)
+        if self._uniform_sides:
+            rolls = _rng.integers(1, self._sides[0], size=int(self._num_dice.sum()), dtype=np.int64, endpoint=True)
+        else:
+            rolls = _rng.integers(1, np.repeat(self._sides, self._num_dice), dtype=np.int64, endpoint=True)
+        return total + int(rolls @ np.repeat(self._sign, self._num_dice))
 
     def roll_to_str(self) -> str:
         return f"Rolled {self}    = {self.roll()}"
@@ -151,10 +369,20 @@ class TokenType(StrEnum):
         return f"{type(self).__name__}.{self.name}"
 
 
-@dataclass(frozen=True, slots=True)
-class Token:
-    type: TokenType
-    value: str | int | None
+# Bound once at import so the parser's inner loops skip the enum attribute lookups.
+_T_INT = TokenType.INTEGER
+_T_DELIM = TokenType.DELIM
+_T_PLUS = TokenType.PLUS
+_T_MINUS = TokenType.MINUS
+_T_EOF = TokenType.EOF
+_PM = frozenset((_T_PLUS, _T_MINUS))
+
+
+# Tokens are plain (type, value) tuples; they are cheaper to build and index than a dataclass.
+Token = tuple[TokenType, str | int | None]
+
+
+_TOKEN_RE = re.compile(r"\s+|(?P<int>\d+)|(?P<d>d)|(?P<plus>\+)|(?P<minus>-)|(?P<invalid>.)", re.DOTALL)
 
 
 class Lexer:
@@ -162,29 +390,11 @@ class Lexer:
         if not text:
             raise ValueError(f"Invalid input text of: {text!r}")
         self.text = text
-        self._pos = 0
-        self.current_char = self.text[self._pos]
-
-    @property
-    def pos(self) -> int:
-        return self._pos
-
-    @pos.setter
-    def pos(self, value: int) -> None:
-        self._pos = value
-        if value >= len(self.text):
-            self.current_char = None
-        else:
-            self.current_char = self.text[value]
-
-    def advance(self) -> None:
-        self.pos += 1
+        self.tokens = self.tokenize(text)
+        self._i = 0
 
-    def skip_whitespace(self) -> None:
-        while self.current_char is not None and self.current_char.isspace():
-            self.advance()
-
-    def integer(self) -> int:
+    @staticmethod
+    def tokenize(text: str) -> list[Token]:
         """
         dice    : die ((PLUS|MINUS) die)*
         die     : integer? DELIM integer ((PLUS|MINUS) integer)*
@@ -195,42 +405,63 @@ class Lexer:
         PLUS    : "+"
         MINUS   : "-"
         """
-        assert self.current_char is not None and self.current_char.isdecimal()
-        result = ''
-        while self.current_char is not None and self.current_char.isdecimal():
-            result += self.current_char
-            self.advance()
-        return int(result)
+        tokens = []
+        for match in _TOKEN_RE.finditer(text):
+            kind = match.lastgroup
+            if kind is None:
+                continue    # whitespace
+            elif kind == 'int':
+                tokens.append((_T_INT, int(match['int'])))
+            elif kind == 'd':
+                tokens.append((_T_DELIM, 'd'))
+            elif kind == 'plus':
+                tokens.append((_T_PLUS, '+'))
+            elif kind == 'minus':
+                tokens.append((_T_MINUS, '-'))
+            else:
+                raise ValueError(f"Invalid character {match['invalid']!r} at index {match.start()}")
 
-    def get_next_token(self) -> Token:
-        while self.current_char is not None:
-            self.skip_whitespace()
+        tokens.append((_T_EOF, None))
+        return tokens
 
-            if self.current_char.isdecimal():
-                return Token(TokenType.INTEGER, self.integer())
-            elif self.current_char == 'd':
-                self.advance()
-                return Token(TokenType.DELIM, 'd')
-            elif self.current_char == '+':
-                self.advance()
-                return Token(TokenType.PLUS, '+')
-            elif self.current_char == '-':
-                self.advance()
-                return Token(TokenType.MINUS, '-')
+    @property
+    def position(self) -> int:
+        """Index into `tokens` of the token that get_next_token() returns next."""
+        return self._i
 
-            raise ValueError(f"Invalid character {self.current_char!r} at index {self.pos}")
+    def seek(self, position: int) -> None:
+        # Anything past the end of the input is EOF.
+        self._i = min(position, len(self.tokens) - 1)
 
-        return Token(TokenType.EOF, None)
+    def get_next_token(self) -> Token:
+        token = self.tokens[self._i]
+        if token[0] is not _T_EOF:
+            self._i += 1
+        return token
 
     def peek_next_token(self, *, ahead: int = 1) -> Token:
-        # This is a hack to emulate an LL(n) parser with real lookahead.
-        # It is not efficient and it does not need to be. Quiet, you!
         assert ahead > 0, f"peek_next_token() must look ahead at least 1 token; got {ahead}"
-        pos = self.pos
-        for _ in range(ahead):
-            token = self.get_next_token()
-        self.pos = pos
-        return token    # type: ignore
+        # Anything past the end of the input is EOF.
+        return self.tokens[min(self._i + ahead - 1, len(self.tokens) - 1)]
+
+
+def _fuse(items: list[DiceBagItem]) -> list[DiceBagItem]:
+    """Combine the items that roll the same kind of die with the same sign.
+
+    Their dice and modifiers are summed into the first such item, so e.g.
+    d20+1+d20+d4 becomes 2d20+1 + 1d4. The first-appearance order is kept.
+    """
+    fused: dict[tuple[int, bool], Die] = {}
+    for item in items:
+        key = (item.die.sides, item.subtracted)
+        if (die := fused.get(key)) is None:
+            fused[key] = item.die
+        else:
+            fused[key] = Die(die.sides, die.num_dice + item.die.num_dice, die.modifier + item.die.modifier)
+
+    if len(fused) == len(items):
+        return items
+    return [DiceBagItem(die, subtracted) for (_, subtracted), die in fused.items()]
 
 
 class Parser:
@@ -239,10 +470,10 @@ class Parser:
         self.current_token = self.lexer.get_next_token()
 
     def eat(self, expected_token_type: TokenType) -> None:
-        if expected_token_type == self.current_token.type:
+        if self.current_token[0] is expected_token_type:
             self.current_token = self.lexer.get_next_token()
             return
-        raise ValueError(f"Expected token with type {expected_token_type} but got {self.current_token.type}")
+        raise ValueError(f"Expected token with type {expected_token_type} but got {self.current_token[0]}")
 
     def peek_next_token(self, *args, **kwargs) -> Token:
         return self.lexer.peek_next_token(*args, **kwargs)
@@ -260,17 +491,17 @@ class Parser:
         num_dice = 1
         modifier = 0
 
-        if self.current_token.type == TokenType.INTEGER:
+        if self.current_token[0] is _T_INT:
             token = self.current_token
-            self.eat(TokenType.INTEGER)
-            assert type(token.value) is int
-            num_dice = token.value
+            self.eat(_T_INT)
+            assert type(token[1]) is int
+            num_dice = token[1]
 
-        self.eat(TokenType.DELIM)
+        self.eat(_T_DELIM)
         token = self.current_token
-        self.eat(TokenType.INTEGER)
-        assert type(token.value) is int
-        sides = token.value
+        self.eat(_T_INT)
+        assert type(token[1]) is int
+        sides = token[1]
 
         # If there is an operator followed by an integer next, this could
         # either be the modifier for the current die OR the start of a new die.
@@ -288,24 +519,25 @@ class Parser:
         #   2d6+5d4    or    2d6+d4
         #      ^                ^
         #   (operator -> integer -> delimiter = no modifier)
-        while self.current_token.type in (TokenType.PLUS, TokenType.MINUS):
-            # if "the thing after this PLUS/MINUS is a not a modifier"
-            if not (self.peek_next_token().type == TokenType.INTEGER
-                    and self.peek_next_token(ahead=2).type != TokenType.DELIM):
-                break
-
-            if self.current_token.type == TokenType.PLUS:
-                self.eat(TokenType.PLUS)
-                token = self.current_token
-                self.eat(TokenType.INTEGER)
-                assert type(token.value) is int
-                modifier += token.value
-            else:
-                self.eat(TokenType.MINUS)
-                token = self.current_token
-                self.eat(TokenType.INTEGER)
-                assert type(token.value) is int
-                modifier -= token.value
+        #
+        # The token stream is already fully lexed, so the lookahead is done by
+        # indexing into it directly rather than peeking one token at a time.
+        if self.current_token[0] in _PM:
+            tokens = self.lexer.tokens
+            i = self.lexer.position - 1     # index of `current_token`
+            while (tokens[i][0] in _PM
+                   and tokens[i + 1][0] is _T_INT
+                   and tokens[i + 2][0] is not _T_DELIM):
+                value = tokens[i + 1][1]
+                assert type(value) is int
+                if tokens[i][0] is _T_PLUS:
+                    modifier += value
+                else:
+                    modifier -= value
+                i += 2
+
+            self.lexer.seek(i + 1)
+            self.current_token = tokens[i]
 
         return Die(sides, num_dice, modifier)
 
@@ -320,18 +552,17 @@ class Parser:
         PLUS    : "+"
         MINUS   : "-"
         """
-        to_return = DiceBag()
-        to_return.add_die(self.die())
+        items = [DiceBagItem(self.die())]
 
-        while self.current_token.type in (TokenType.PLUS, TokenType.MINUS):
-            if self.current_token.type == TokenType.PLUS:
-                self.eat(TokenType.PLUS)
-                to_return.add_die(self.die())
+        while self.current_token[0] in _PM:
+            if self.current_token[0] is _T_PLUS:
+                self.eat(_T_PLUS)
+                items.append(DiceBagItem(self.die()))
             else:
-                self.eat(TokenType.MINUS)
-                to_return.add_die(self.die(), subtracted=True)
+                self.eat(_T_MINUS)
+                items.append(DiceBagItem(self.die(), subtracted=True))
 
-        return to_return
+        return DiceBag(tuple(_fuse(items)))
 
 
 def roll(formula: str):
@@ -342,6 +573,19 @@ def roll_to_str(formula: str):
     return DiceBag.from_str(formula).roll_to_str()
 
 
+def seed(a: int | float | str | bytes | None = None) -> None:
+    """Seed every random number generator used to roll dice.
+
+    Works like random.seed(), but also reseeds the NumPy generator used for
+    large rolls (when NumPy is installed), so the same seed always gives the
+    same rolls.
+    """
+    global _rng
+    random.seed(a)
+    if np is not None:
+        _rng = np.random.default_rng(random.getrandbits(128))
+
+
 def main():
     print('Parses dice formulas (q or Q to quit)', end='\n\n')
 
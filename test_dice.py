@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+import unittest
+
+import dice
+
+
+class SeedTest(unittest.TestCase):
+    # A d1 and a pool of 5+ dice (rolled by NumPy when it's installed) are
+    # exactly the cases where the generated roller must draw like Die.roll().
+    FORMULA = "2d1+8d6-d4+3"
+
+    def rolls(self, n: int, seed: int = 42) -> list[int]:
+        dice.seed(seed)
+        return [dice.roll(self.FORMULA) for _ in range(n)]
+
+    def test_seed_repeats_rolls_of_cached_formula(self):
+        first = self.rolls(5)
+        for _ in range(3):
+            self.assertEqual(self.rolls(5), first)
+
+    def test_seed_repeats_rolls_of_fresh_bag(self):
+        expected = self.rolls(5)
+        bag = dice.Parser(self.FORMULA).dice()
+        dice.seed(42)
+        self.assertEqual([bag.roll() for _ in range(5)], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()